@@ -8,7 +8,7 @@ Zotero 完整清理工具
 """
 import os
 import sys
-import re
+import errno
 import shutil
 import sqlite3
 import stat
@@ -17,7 +17,39 @@ import tkinter as tk
 from tkinter import filedialog
 from pathlib import Path
 from collections import defaultdict
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 判断空文件夹时忽略的系统/缓存文件
+IGNORED_FILES = frozenset(['.DS_Store', 'Thumbs.db', 'desktop.ini', '.zotero-ft-cache'])
+
+# '.pdf' 后缀的所有大小写组合，str.endswith 可直接比较而无需 lower()
+PDF_SUFFIXES = tuple(
+    '.' + p + d + f for p in 'pP' for d in 'dD' for f in 'fF')
+
+# 并行扫描 storage 顶层子文件夹时使用的线程数
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# 并行扫描前预留的文件描述符数量
+FD_RESERVE = 256
+
+# 移动/删除过程中缓冲的日志达到该行数时即输出，长时间运行也能看到进度
+LOG_FLUSH_LINES = 200
+
+# prefs.js 中自定义数据目录所在行的前缀
+DATA_DIR_PREF = 'user_pref("extensions.zotero.dataDir"'
+
+
+def parse_data_dir_pref(configs):
+    """逐行查找 prefs.js 中的 dataDir 设置，返回其中的路径字符串（未找到时返回 None）"""
+    for line in configs.splitlines():
+        line = line.strip()
+        if line.startswith(DATA_DIR_PREF):
+            # 形如 user_pref("extensions.zotero.dataDir", "C:\\path");
+            value = line[len(DATA_DIR_PREF):].partition('"')[2].partition('"')[0]
+            if value:
+                return value
+    return None
 
 
 def get_zotero_dirs():
@@ -55,12 +87,10 @@ def get_zotero_dirs():
     
     configs = prefs_js.read_text(encoding='utf-8')
     
-    zotero_data_pat = re.compile(
-        r'user_pref\("extensions\.zotero\.dataDir",\s*"(?P<zotero_data>[^"]+)"\);')
-    zotero_match = zotero_data_pat.search(configs)
+    data_dir_str = parse_data_dir_pref(configs)
     
-    if zotero_match:
-        data_dir_str = zotero_match.group('zotero_data').replace('\\\\', '\\')
+    if data_dir_str:
+        data_dir_str = data_dir_str.replace('\\\\', '\\')
         zotero_data_dir = Path(data_dir_str)
     else:
         zotero_data_dir = profile_dir / 'Zotero'
@@ -82,16 +112,107 @@ def get_zotero_dirs():
     return zotero_data_dir, storage_dir
 
 
-def collect_pdf_files(storage_dir):
-    """收集 storage 目录中的所有 PDF 文件"""
-    pdf_files = []
+def _fd_in_use(fd):
+    """检查文件描述符编号是否已被占用"""
+    try:
+        os.fstat(fd)
+    except OSError:
+        return False
+    return True
+
+
+def prepare_fd_table(reserve=FD_RESERVE):
+    """POSIX 下确保文件描述符上限足够，并预先扩展进程的描述符表
+
+    通过把一个描述符 dup2 到预留范围的最高编号，让内核一次性扩展描述符表，
+    避免并行扫描时多个线程反复触发扩展。Windows 下不做处理。
+    """
+    if os.name != 'posix':
+        return
     
+    import resource
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft == resource.RLIM_INFINITY:
+            soft = reserve
+        elif soft < reserve:
+            if hard == resource.RLIM_INFINITY or hard >= reserve:
+                soft = reserve
+            else:
+                soft = hard
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        
+        target = min(reserve, soft) - 1
+        if _fd_in_use(target):
+            return  # 该编号已被占用，描述符表已足够大
+        
+        fd = os.open(os.devnull, os.O_RDONLY)
+        try:
+            if fd < target:
+                os.dup2(fd, target)
+                os.close(target)
+        finally:
+            os.close(fd)
+    except (OSError, ValueError):
+        pass
+
+
+def _scan_dir(path):
+    """用 os.scandir 列出文件夹，产出 (完整路径, 名称, 是否为文件夹)
+
+    只产出普通文件和文件夹，不跟随符号链接。
+    """
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield entry.path, entry.name, True
+            elif entry.is_file(follow_symlinks=False):
+                yield entry.path, entry.name, False
+
+
+def _iter_pdfs(top_dir, top_name):
+    """基于 _scan_dir 的迭代遍历，逐个产出 (完整路径, 文件名, 所在文件夹名)
+
+    文件夹名随路径一起入栈，直接取自目录项，无需再从路径中拆分。
+    """
+    stack = [(top_dir, top_name)]
+    while stack:
+        current, folder = stack.pop()
+        # 文件夹名驻留（intern），与数据库中的文件夹名比较时可直接命中
+        folder = sys.intern(folder)
+        try:
+            for full_path, name, is_dir in _scan_dir(current):
+                if is_dir:
+                    stack.append((full_path, name))
+                elif name.endswith(PDF_SUFFIXES):
+                    yield full_path, name, folder
+        except (OSError, PermissionError):
+            # 与 os.walk 一致：无法读取的目录直接跳过
+            continue
+
+
+def _list_top_dirs(storage_dir):
+    """列出 storage 目录下的顶层子文件夹 (路径, 名称)，以及直接位于其中的 PDF 文件"""
+    top_dirs = []
+    top_pdfs = []
+    folder = sys.intern(os.path.basename(str(storage_dir)))
+    for full_path, name, is_dir in _scan_dir(str(storage_dir)):
+        if is_dir:
+            top_dirs.append((full_path, name))
+        elif name.endswith(PDF_SUFFIXES):
+            top_pdfs.append((full_path, name, folder))
+    return top_dirs, top_pdfs
+
+
+def collect_pdf_files(storage_dir):
+    """收集 storage 目录中的所有 PDF 文件，返回 (完整路径, 文件名, 所在文件夹名) 列表"""
     print("\n正在扫描 PDF 文件...")
-    for root, dirs, files in os.walk(storage_dir):
-        for file in files:
-            if file.lower().endswith('.pdf'):
-                full_path = os.path.join(root, file)
-                pdf_files.append((full_path, file))
+    top_dirs, pdf_files = _list_top_dirs(storage_dir)
+    
+    # 各顶层子文件夹互不相关，用线程池并行遍历
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        for result in executor.map(lambda d: list(_iter_pdfs(*d)), top_dirs):
+            pdf_files.extend(result)
     
     print(f"找到 {len(pdf_files)} 个 PDF 文件")
     return pdf_files
@@ -107,49 +228,54 @@ def get_database_pdfs(zotero_data_dir):
     
     print("\n正在读取数据库...")
     try:
-        with sqlite3.connect(str(db_path)) as con:
+        # 以只读方式打开，避免对 Zotero 数据库加写锁
+        db_uri = f"{db_path.resolve().as_uri()}?mode=ro"
+        with sqlite3.connect(db_uri, uri=True) as con:
+            con.execute('PRAGMA temp_store=MEMORY')
+            con.execute('PRAGMA cache_size=-65536')
+            con.execute('PRAGMA mmap_size=268435456')
+            
+            # 由 SQLite 直接截取 ':' 之后的部分，逐行读取游标
             query = """
             SELECT 
                 ia.itemID,
-                ia.parentItemID,
                 ia.path,
-                i.key as itemKey
+                i.key as itemKey,
+                substr(ia.path, instr(ia.path, ':') + 1) as rest
             FROM itemAttachments ia
             LEFT JOIN items i ON ia.itemID = i.itemID
-            WHERE ia.path IS NOT NULL
+            WHERE ia.path IS NOT NULL AND instr(ia.path, ':') > 0
             """
-            item_att = pd.read_sql_query(query, con=con)
-            
-            print(f"数据库中有 {len(item_att)} 条附件记录")
             
             db_files = {}
             db_folders = set()  # 数据库中所有有效的文件夹
             
-            for _, row in item_att.iterrows():
-                path = row['path']
-                if isinstance(path, str) and ':' in path:
-                    parts = path.split(':', 1)[1]
-                    
-                    if '/' in parts or '\\' in parts:
-                        parts = parts.replace('\\', '/')
-                        folder = parts.split('/')[0]
-                        filename = parts.split('/')[-1]
-                    else:
-                        folder = row['itemKey']
-                        filename = parts
-                    
-                    db_folders.add(folder)
-                    
-                    if filename not in db_files:
-                        db_files[filename] = []
-                    
-                    db_files[filename].append({
-                        'folder': folder,
-                        'itemKey': row['itemKey'],
-                        'db_path': path,
-                        'itemID': row['itemID']
-                    })
+            for item_id, path, item_key, rest in con.execute(query):
+                rest = rest.replace('\\', '/')
+                head, sep, _ = rest.partition('/')
+                if sep:
+                    folder = sys.intern(head)
+                    filename = rest.rpartition('/')[2]
+                else:
+                    folder = sys.intern(item_key) if item_key is not None else None
+                    filename = rest
+                
+                db_folders.add(folder)
+                
+                if filename not in db_files:
+                    db_files[filename] = []
+                
+                db_files[filename].append({
+                    'folder': folder,
+                    'itemKey': item_key,
+                    'db_path': path,
+                    'itemID': item_id
+                })
             
+            # 与只取 storage 路径的查询分开统计，计入所有非空路径（包括绝对路径的链接文件）
+            record_count = con.execute(
+                "SELECT COUNT(*) FROM itemAttachments WHERE path IS NOT NULL").fetchone()[0]
+            print(f"数据库中有 {record_count} 条附件记录")
             print(f"数据库中有 {len(db_folders)} 个有效文件夹")
             return db_files, db_folders
     except Exception as e:
@@ -159,104 +285,128 @@ def get_database_pdfs(zotero_data_dir):
         sys.exit(1)
 
 
-def clean_duplicate_pdfs(pdf_files, db_files, back_dir):
-    """清理重复的 PDF 文件"""
+def classify_pdf_files(pdf_files, db_files):
+    """按文件名一次性分组，并划分出重复文件和孤立文件"""
     pdf_by_name = defaultdict(list)
     
-    for full_path, filename in pdf_files:
-        folder = os.path.basename(os.path.dirname(full_path))
-        pdf_by_name[filename].append({
-            'full_path': full_path,
-            'folder': folder
-        })
+    for full_path, filename, folder in pdf_files:
+        pdf_by_name[filename].append((full_path, folder))
     
-    duplicates = {name: files for name, files in pdf_by_name.items() if len(files) > 1}
+    duplicates = {}
+    orphaned = {}
+    for name, files in pdf_by_name.items():
+        if name not in db_files:
+            orphaned[name] = files
+        elif len(files) > 1:
+            duplicates[name] = files
     
+    return duplicates, orphaned
+
+
+def replace_or_move(src, dst):
+    """优先用 os.replace 重命名，跨文件系统失败（EXDEV）时回退到 shutil.move
+
+    同一文件系统上只需一次 rename；是否跨文件系统以 rename 的结果为准，
+    不预先比较 st_dev（同一文件系统的两个 bind mount 之间 rename 也会失败）。
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
+
+def flush_log(log):
+    """将缓冲的日志行一次性写到标准输出，并清空缓冲"""
+    if log:
+        sys.stdout.write('\n'.join(log) + '\n')
+        sys.stdout.flush()
+        log.clear()
+
+
+def reserve_backup_name(dest_filename, used_names):
+    """在备份目录已占用的文件名集合中选取一个不冲突的文件名并登记
+
+    used_names 中保存小写文件名，以兼容大小写不敏感的文件系统（Windows/macOS）
+    """
+    base, ext = os.path.splitext(dest_filename)
+    candidate = dest_filename
+    counter = 0
+    while candidate.lower() in used_names:
+        counter += 1
+        candidate = f"{base}_{counter}{ext}"
+    used_names.add(candidate.lower())
+    return candidate
+
+
+def clean_duplicate_pdfs(duplicates, db_files, back_dir, used_names):
+    """清理重复的 PDF 文件（仅处理数据库中存在的文件名），返回成功移动的文件路径集合"""
     if not duplicates:
         print("\n没有发现重复的 PDF 文件")
-        return 0
+        return set()
     
     print(f"\n{'='*60}")
     print(f"发现 {len(duplicates)} 个重复的文件名:")
     print(f"{'='*60}")
     
     files_to_delete = []
+    log = []  # 逐条信息先缓冲，再批量输出
     
     for i, (filename, file_list) in enumerate(duplicates.items(), 1):
-        print(f"\n{i}. {filename} (共 {len(file_list)} 份)")
+        log.append(f"\n{i}. {filename} (共 {len(file_list)} 份)")
         
-        if filename in db_files:
-            db_folders = [rec['folder'] for rec in db_files[filename]]
-            print(f"   数据库中的文件夹: {db_folders}")
-            
-            for file_info in file_list:
-                folder = file_info['folder']
-                full_path = file_info['full_path']
-                
-                if folder in db_folders:
-                    print(f"   ✓ 保留: {folder}/")
-                else:
-                    print(f"   ✗ 删除: {folder}/")
-                    files_to_delete.append(full_path)
-        else:
-            print(f"   ⚠ 文件不在数据库中，全部标记为删除")
-            for file_info in file_list:
-                print(f"   ✗ 删除: {file_info['folder']}/")
-                files_to_delete.append(file_info['full_path'])
+        db_folders = [rec['folder'] for rec in db_files[filename]]
+        log.append(f"   数据库中的文件夹: {db_folders}")
+        
+        for full_path, folder in file_list:
+            if folder in db_folders:
+                log.append(f"   ✓ 保留: {folder}/")
+            else:
+                log.append(f"   ✗ 删除: {folder}/")
+                files_to_delete.append((full_path, filename, folder))
+    
+    flush_log(log)
     
     print(f"\n{'='*60}")
     print(f"总计需要删除 {len(files_to_delete)} 个重复文件")
     print(f"{'='*60}")
     
     if not files_to_delete:
-        return 0
+        return set()
     
     choice = input("\n是否将这些重复文件移动到备份目录? (y/n): ").strip().lower()
     
     if choice != 'y':
         print("已取消操作")
-        return 0
+        return set()
     
     print("\n开始移动重复文件...")
-    success_count = 0
-    
-    for full_path in files_to_delete:
-        try:
-            filename = os.path.basename(full_path)
-            folder = os.path.basename(os.path.dirname(full_path))
-            
-            dest_filename = f"dup_{folder}_{filename}"
-            dest_path = os.path.join(back_dir, dest_filename)
-            
-            counter = 1
-            while os.path.exists(dest_path):
-                base, ext = os.path.splitext(dest_filename)
-                dest_path = os.path.join(back_dir, f"{base}_{counter}{ext}")
-                counter += 1
-            
-            shutil.move(full_path, dest_path)
-            print(f"✓ 已移动: {folder}/{filename}")
-            success_count += 1
-        except Exception as e:
-            print(f"✗ 移动失败 {filename}: {e}")
+    moved_paths = set()
     
-    print(f"\n成功移动 {success_count} 个重复文件")
-    return success_count
+    try:
+        for full_path, filename, folder in files_to_delete:
+            try:
+                dest_filename = reserve_backup_name(f"dup_{folder}_{filename}", used_names)
+                dest_path = os.path.join(back_dir, dest_filename)
+                
+                replace_or_move(full_path, dest_path)
+                log.append(f"✓ 已移动: {folder}/{filename}")
+                moved_paths.add(full_path)
+            except Exception as e:
+                log.append(f"✗ 移动失败 {filename}: {e}")
+            if len(log) >= LOG_FLUSH_LINES:
+                flush_log(log)
+    finally:
+        # 即使中途被中断（如 Ctrl-C），也输出已完成的操作记录
+        flush_log(log)
+    
+    print(f"\n成功移动 {len(moved_paths)} 个重复文件")
+    return moved_paths
 
 
-def clean_orphaned_pdfs(pdf_files, db_files, back_dir):
+def clean_orphaned_pdfs(orphaned, back_dir, used_names):
     """清理孤立的 PDF 文件"""
-    pdf_by_name = defaultdict(list)
-    
-    for full_path, filename in pdf_files:
-        folder = os.path.basename(os.path.dirname(full_path))
-        pdf_by_name[filename].append({
-            'full_path': full_path,
-            'folder': folder
-        })
-    
-    orphaned = {name: files for name, files in pdf_by_name.items() if name not in db_files}
-    
     if not orphaned:
         print("\n没有发现孤立的 PDF 文件")
         return 0
@@ -266,10 +416,13 @@ def clean_orphaned_pdfs(pdf_files, db_files, back_dir):
     print(f"{'='*60}")
     
     orphaned_files = []
+    log = []  # 逐条信息先缓冲，再批量输出
     for filename, file_list in orphaned.items():
-        for file_info in file_list:
-            orphaned_files.append((file_info['full_path'], filename, file_info['folder']))
-            print(f"  - {file_info['folder']}/{filename}")
+        for full_path, folder in file_list:
+            orphaned_files.append((full_path, filename, folder))
+            log.append(f"  - {folder}/{filename}")
+    
+    flush_log(log)
     
     choice = input(f"\n是否将这 {len(orphaned_files)} 个孤立文件移动到备份目录? (y/n): ").strip().lower()
     
@@ -280,22 +433,22 @@ def clean_orphaned_pdfs(pdf_files, db_files, back_dir):
     print("\n开始移动孤立文件...")
     success_count = 0
     
-    for full_path, filename, folder in orphaned_files:
-        try:
-            dest_filename = f"orphan_{folder}_{filename}"
-            dest_path = os.path.join(back_dir, dest_filename)
-            
-            counter = 1
-            while os.path.exists(dest_path):
-                base, ext = os.path.splitext(dest_filename)
-                dest_path = os.path.join(back_dir, f"{base}_{counter}{ext}")
-                counter += 1
-            
-            shutil.move(full_path, dest_path)
-            print(f"✓ 已移动: {folder}/{filename}")
-            success_count += 1
-        except Exception as e:
-            print(f"✗ 移动失败 {filename}: {e}")
+    try:
+        for full_path, filename, folder in orphaned_files:
+            try:
+                dest_filename = reserve_backup_name(f"orphan_{folder}_{filename}", used_names)
+                dest_path = os.path.join(back_dir, dest_filename)
+                
+                replace_or_move(full_path, dest_path)
+                log.append(f"✓ 已移动: {folder}/{filename}")
+                success_count += 1
+            except Exception as e:
+                log.append(f"✗ 移动失败 {filename}: {e}")
+            if len(log) >= LOG_FLUSH_LINES:
+                flush_log(log)
+    finally:
+        # 即使中途被中断（如 Ctrl-C），也输出已完成的操作记录
+        flush_log(log)
     
     print(f"\n成功移动 {success_count} 个孤立文件")
     return success_count
@@ -304,23 +457,48 @@ def clean_orphaned_pdfs(pdf_files, db_files, back_dir):
 def is_folder_empty(path):
     """检查文件夹是否为空"""
     try:
-        items = os.listdir(path)
-        items = [item for item in items if item not in ['.DS_Store', 'Thumbs.db', 'desktop.ini', '.zotero-ft-cache']]
-        return len(items) == 0
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name not in IGNORED_FILES:
+                    return False
+        return True
     except (OSError, PermissionError):
         return False
 
 
-def has_pdf_files(path):
-    """检查文件夹是否包含 PDF 文件"""
+def has_pdf_files(path, cache=None, root=None):
+    """检查文件夹是否包含 PDF 文件（找到第一个即返回），可选地用 cache 记忆结果
+
+    root 为缓存向上传递结果的边界（通常是 storage 目录），不会写入 root 及其以上的路径。
+    """
+    key = os.path.abspath(path)
+    if cache is not None and key in cache:
+        return cache[key]
+    
+    result = False
+    stack = [path]
     try:
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if file.lower().endswith('.pdf'):
-                    return True
-        return False
+        while stack and not result:
+            for full_path, name, is_dir in _scan_dir(stack.pop()):
+                if is_dir:
+                    stack.append(full_path)
+                elif name.endswith(PDF_SUFFIXES):
+                    result = True
+                    break
     except (OSError, PermissionError):
-        return True
+        # 无法读取时按包含 PDF 处理，避免误删
+        result = True
+    
+    if cache is not None:
+        cache[key] = result
+        if result:
+            # 包含 PDF 的文件夹，其上级文件夹也必然包含 PDF；
+            # 遇到已标记的上级或到达 root 即停止
+            parent = os.path.dirname(key)
+            while parent != key and parent != root and not cache.get(parent):
+                cache[parent] = True
+                key, parent = parent, os.path.dirname(parent)
+    return result
 
 
 def remove_readonly(path):
@@ -331,24 +509,60 @@ def remove_readonly(path):
         pass
 
 
-def delete_folder_safe(dir_path):
-    """安全删除文件夹"""
+def _retry_after_chmod(func, path, exc):
+    """rmtree 删除失败时才移除只读属性，然后重试一次
+
+    只重试 os.unlink/os.remove/os.rmdir；其他操作（如 os.open、os.scandir、
+    os.lstat）的失败直接抛出原始异常。exc 在 onexc 下是异常对象，
+    在 onerror 下是 sys.exc_info() 元组。
+    """
+    if isinstance(exc, tuple):
+        exc = exc[1]
+    if func not in (os.unlink, os.remove, os.rmdir):
+        raise exc
+    remove_readonly(path)
+    func(path)
+
+
+def delete_folder_safe(dir_path, log=None):
+    """安全删除文件夹，失败信息写入 log（未提供时直接输出）"""
     try:
-        remove_readonly(dir_path)
-        
-        for root, dirs, files in os.walk(dir_path):
-            for d in dirs:
-                remove_readonly(os.path.join(root, d))
-            for f in files:
-                remove_readonly(os.path.join(root, f))
-        
-        shutil.rmtree(dir_path)
+        # Python 3.12 起 onerror 已弃用，改用参数签名兼容的 onexc
+        if sys.version_info >= (3, 12):
+            shutil.rmtree(dir_path, onexc=_retry_after_chmod)
+        else:
+            shutil.rmtree(dir_path, onerror=_retry_after_chmod)
         return True
     except Exception as e:
-        print(f"⚠ 无法删除: {dir_path} - {e}")
+        message = f"⚠ 无法删除: {dir_path} - {e}"
+        if log is None:
+            print(message)
+        else:
+            log.append(message)
         return False
 
 
+def _collect_subfolders(top_dir, top_name):
+    """自底向上收集 top_dir 下的所有文件夹 (路径, 名称)，包括 top_dir 本身
+
+    先按深度优先的先序收集再整体反转，保证子文件夹总排在父文件夹之前。
+    """
+    folders = []
+    stack = [(top_dir, top_name)]
+    while stack:
+        current = stack.pop()
+        folders.append(current)
+        try:
+            for full_path, name, is_dir in _scan_dir(current[0]):
+                if is_dir:
+                    stack.append((full_path, name))
+        except (OSError, PermissionError):
+            # 与 os.walk 一致：无法读取的目录不再深入
+            continue
+    folders.reverse()
+    return folders
+
+
 def clean_empty_folders(storage_dir, db_folders):
     """清理空文件夹和不在数据库中的文件夹"""
     print(f"\n{'='*60}")
@@ -357,39 +571,40 @@ def clean_empty_folders(storage_dir, db_folders):
     
     empty_count = 0
     invalid_count = 0
-    deleted = True
-    
-    while deleted:
-        deleted = False
-        folders_to_check = []
-        
-        # 收集所有子文件夹
-        for root, dirs, files in os.walk(storage_dir, topdown=False):
-            for dir_name in dirs:
-                dir_path = os.path.join(root, dir_name)
-                if os.path.abspath(dir_path) != os.path.abspath(storage_dir):
-                    folders_to_check.append(dir_path)
-        
-        for dir_path in folders_to_check:
+    pdf_cache = {}  # 各文件夹是否包含 PDF
+    storage_root = os.path.abspath(storage_dir)
+    folders_to_check = []
+    
+    # 自底向上收集所有子文件夹（按顶层子文件夹并行遍历），子文件夹总在父文件夹之前
+    top_dirs, _ = _list_top_dirs(storage_dir)
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        for result in executor.map(lambda d: _collect_subfolders(*d), top_dirs):
+            folders_to_check.extend(result)
+    
+    # 单次遍历即可：检查父文件夹时，其子文件夹的删除结果已生效
+    log = []  # 逐条信息先缓冲，再批量输出
+    try:
+        for dir_path, folder_name in folders_to_check:
             try:
-                folder_name = os.path.basename(dir_path)
-                
                 # 检查是否为空
                 if is_folder_empty(dir_path):
                     os.rmdir(dir_path)
-                    print(f"✓ 已删除空文件夹: {folder_name}")
+                    log.append(f"✓ 已删除空文件夹: {folder_name}")
                     empty_count += 1
-                    deleted = True
                 # 检查是否不含 PDF 且不在数据库中
-                elif not has_pdf_files(dir_path) and folder_name not in db_folders:
-                    if delete_folder_safe(dir_path):
-                        print(f"✓ 已删除无效文件夹: {folder_name} (无PDF且不在数据库中)")
+                elif not has_pdf_files(dir_path, pdf_cache, storage_root) and folder_name not in db_folders:
+                    if delete_folder_safe(dir_path, log):
+                        log.append(f"✓ 已删除无效文件夹: {folder_name} (无PDF且不在数据库中)")
                         invalid_count += 1
-                        deleted = True
             except PermissionError:
-                print(f"⚠ 权限不足，跳过: {folder_name}")
+                log.append(f"⚠ 权限不足，跳过: {folder_name}")
             except Exception as e:
-                print(f"⚠ 处理失败: {folder_name} - {e}")
+                log.append(f"⚠ 处理失败: {folder_name} - {e}")
+            if len(log) >= LOG_FLUSH_LINES:
+                flush_log(log)
+    finally:
+        # 即使中途被中断（如 Ctrl-C），也输出已完成的操作记录
+        flush_log(log)
     
     print(f"\n清理统计:")
     print(f"  - 删除空文件夹: {empty_count} 个")
@@ -418,8 +633,13 @@ def main():
     if not os.path.exists(back_dir):
         os.makedirs(back_dir)
     
+    # 记录备份目录中已存在的文件名，避免移动时反复探测文件是否存在
+    with os.scandir(back_dir) as it:
+        used_names = {entry.name.lower() for entry in it}
+    
     # 获取 Zotero 目录
     zotero_data_dir, storage_dir = get_zotero_dirs()
+    prepare_fd_table()
     
     # 收集 PDF 文件
     pdf_files = collect_pdf_files(storage_dir)
@@ -436,21 +656,23 @@ def main():
     print(f"  - 数据库记录: {len(db_files)}")
     print(f"  - 有效文件夹: {len(db_folders)}")
     
+    # 按文件名分组，一次性划分重复文件和孤立文件
+    duplicates, orphaned = classify_pdf_files(pdf_files, db_files)
+    
     # 步骤1: 清理重复的 PDF
     print(f"\n{'='*60}")
     print("步骤 1: 清理重复的 PDF 文件")
     print(f"{'='*60}")
-    dup_count = clean_duplicate_pdfs(pdf_files, db_files, back_dir)
+    moved_paths = clean_duplicate_pdfs(duplicates, db_files, back_dir, used_names)
+    dup_count = len(moved_paths)
     
-    # 重新扫描（因为删除了一些文件）
-    if dup_count > 0:
-        pdf_files = collect_pdf_files(storage_dir)
+    # 无需重新扫描：已移动的重复文件都在数据库中，不会出现在孤立文件列表里
     
     # 步骤2: 清理孤立的 PDF
     print(f"\n{'='*60}")
     print("步骤 2: 清理孤立的 PDF 文件")
     print(f"{'='*60}")
-    orphan_count = clean_orphaned_pdfs(pdf_files, db_files, back_dir)
+    orphan_count = clean_orphaned_pdfs(orphaned, back_dir, used_names)
     
     # 步骤3: 清理空文件夹和无效文件夹
     print(f"\n{'='*60}")